@@ -1,10 +1,57 @@
+import os
 import sys
-import random
 import time
+LAUNCH_TIME = time.perf_counter()
+
+import random
 import math
-from OpenGL.GL import *
-from OpenGL.GLU import *
-from OpenGL.GLUT import *
+import array
+import ctypes
+import struct
+import hashlib
+import marshal
+import tempfile
+import atexit
+import threading
+from collections import deque, namedtuple
+
+# PyOpenGL reads its error flags at import time, so set them first.
+# Release builds (--release) skip per-call glGetError checks and error logging.
+import OpenGL
+RELEASE_BUILD = '--release' in sys.argv
+OpenGL.ERROR_CHECKING = not RELEASE_BUILD
+OpenGL.ERROR_LOGGING = not RELEASE_BUILD
+
+gl_import_start = time.perf_counter()
+from OpenGL.GL import (
+    GL_AMBIENT, GL_AMBIENT_AND_DIFFUSE, GL_ARRAY_BUFFER, GL_COLOR_BUFFER_BIT,
+    GL_COLOR_MATERIAL, GL_COMPILE_STATUS, GL_DEPTH_BUFFER_BIT, GL_DEPTH_TEST, GL_DIFFUSE,
+    GL_FALSE, GL_FLOAT, GL_FRAGMENT_SHADER, GL_FRONT, GL_LIGHT0, GL_LIGHTING, GL_LINES,
+    GL_LINK_STATUS, GL_MODELVIEW, GL_MODELVIEW_MATRIX, GL_POSITION, GL_PROJECTION,
+    GL_PROJECTION_MATRIX, GL_QUADS, GL_SHININESS, GL_SMOOTH, GL_SPECULAR, GL_STATIC_DRAW,
+    GL_STREAM_DRAW, GL_TRIANGLES, GL_TRIANGLE_FAN, GL_VERSION, GL_VERTEX_SHADER,
+    glAttachShader, glBegin, glBindAttribLocation, glBindBuffer, glBindVertexArray,
+    glBufferData, glClear, glClearColor, glColor3f, glColorMaterial, glCompileShader,
+    glCreateProgram, glCreateShader, glDrawArraysInstanced, glEnable,
+    glEnableVertexAttribArray, glEnd, glGenBuffers, glGenVertexArrays, glGetFloatv,
+    glGetProgramInfoLog, glGetProgramiv, glGetShaderInfoLog, glGetShaderiv, glGetString,
+    glGetUniformLocation, glLightfv, glLineWidth, glLinkProgram, glLoadIdentity,
+    glMaterialfv, glMatrixMode, glPopMatrix, glPushMatrix, glRotatef, glScalef,
+    glShadeModel, glShaderSource, glTranslatef, glUniform1f, glUniform3f,
+    glUniformMatrix4fv, glUseProgram, glVertex3f, glVertexAttribDivisor,
+    glVertexAttribPointer, glViewport, glWindowPos2f,
+)
+from OpenGL.GLU import gluLookAt, gluPerspective
+from OpenGL.GLUT import (
+    GLUT_BITMAP_HELVETICA_18, GLUT_DEPTH, GLUT_DOUBLE, GLUT_KEY_DOWN, GLUT_KEY_LEFT,
+    GLUT_KEY_RIGHT, GLUT_KEY_UP, GLUT_RGB, GLUT_WINDOW_HEIGHT, GLUT_WINDOW_WIDTH,
+    glutBitmapCharacter, glutCreateWindow, glutDisplayFunc, glutGet, glutIdleFunc, glutInit,
+    glutInitDisplayMode, glutInitWindowSize, glutKeyboardFunc, glutMainLoop,
+    glutPostRedisplay, glutReshapeFunc, glutSolidCone, glutSolidCube, glutSolidSphere,
+    glutSpecialFunc, glutSwapBuffers, glutWireCube,
+)
+from OpenGL.error import GLError
+GL_IMPORT_TIME = time.perf_counter() - gl_import_start
 
 # Game constants
 GRID_SIZE = 20
@@ -13,6 +60,11 @@ MOVE_INTERVAL = 0.15
 SPEED_CHANGE_DURATION = 5
 COLOR_CHANGE_DURATION = 5
 MAX_FOODS = 5
+ARENA_BOX_SIZE = 2 * (GRID_SIZE // 2) - 1  # Interior of the 3D arena
+ASSET_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'asset_cache', 'meshes.bin')
+ASSET_CACHE_MAGIC = b'SNKMESH1'
+SIM_TICK_INTERVAL = 0.01  # Simulation thread runs at 100 ticks per second
+MAX_QUEUED_TURNS = 3
 
 # Food types
 NORMAL_FOOD = 0
@@ -26,6 +78,59 @@ EASY = 0
 MEDIUM = 1
 HARD = 2
 
+CAMERA_MODES = ["First-Person", "Third-Person", "Top-Down", "Free-Look"]
+
+# Render backends, selected with --renderer=<name>
+RENDERER_LEGACY = 'legacy'
+RENDERER_SHADER = 'shader'
+
+# Input command kinds, queued by the GLUT callbacks for the simulation thread
+KEY_COMMAND = 0
+SPECIAL_KEY_COMMAND = 1
+
+# Immutable render state published by the simulation thread
+SegmentState = namedtuple('SegmentState', ['position', 'direction', 'target_position'])
+FoodState = namedtuple('FoodState', ['position', 'type', 'rotation'])
+ObstacleState = namedtuple('ObstacleState', [
+    'position', 'rotation', 'scale', 'color', 'pulse_factor', 'move_direction', 'moving'
+])
+GameSnapshot = namedtuple('GameSnapshot', [
+    'segments', 'snake_color', 'snake_direction', 'length', 'foods', 'obstacles',
+    'score', 'game_over', 'paused', 'camera_mode', 'camera_angle_x', 'camera_angle_y',
+    'camera_distance', 'difficulty', 'selecting_difficulty', 'tick', 'snake_heading', 'volumetric'
+])
+
+class OccupancyVolume:
+    # Packed bitset with one bit per cell of the arena interior. Lookups and
+    # updates are constant time and a 64x64x64 arena only needs 32 KB.
+    def __init__(self, size):
+        self.low = -(size // 2) + 1
+        self.span = 2 * (size // 2) - 1
+        self.bits = bytearray((self.span ** 3 + 7) // 8)
+        
+    def index(self, pos):
+        x, y, z = pos[0] - self.low, pos[1] - self.low, pos[2] - self.low
+        if not (0 <= x < self.span and 0 <= y < self.span and 0 <= z < self.span):
+            return None
+        return (x * self.span + y) * self.span + z
+        
+    def test(self, pos):
+        i = self.index(pos)
+        return i is not None and bool(self.bits[i >> 3] & (1 << (i & 7)))
+        
+    def set(self, pos):
+        i = self.index(pos)
+        if i is not None:
+            self.bits[i >> 3] |= 1 << (i & 7)
+            
+    def clear(self, pos):
+        i = self.index(pos)
+        if i is not None:
+            self.bits[i >> 3] &= ~(1 << (i & 7))
+            
+    def reset(self):
+        self.bits = bytearray(len(self.bits))
+
 class SnakeSegment:
     def __init__(self, position, direction):
         self.position = position
@@ -44,6 +149,8 @@ class Snake:
         self.segments = [SnakeSegment(initial_pos, initial_dir)]
         self.grow_pending = 2
         self.direction = initial_dir
+        self.heading = initial_dir  # Last horizontal direction, used for turns while climbing
+        self.turn_queue = deque()  # (direction, key_event) turns, applied one per step
         self.base_color = self.generate_random_color()
         self.current_color = self.base_color
         self.speed_multiplier = 1.0
@@ -51,6 +158,9 @@ class Snake:
         self.speed_change_time = 0
         self.last_color_change = 0
         self.length = 1
+        self.occupied = OccupancyVolume(GRID_SIZE)  # Cells under segment target positions
+        self.occupied.set(initial_pos)
+        self.hit_self = False
         
     def generate_random_color(self):
         return (
@@ -61,6 +171,7 @@ class Snake:
         
     def move(self):
         current_time = time.time()
+        applied_turn = None
         
         if current_time > self.speed_change_time:
             self.speed_multiplier = 1.0
@@ -86,6 +197,11 @@ class Snake:
                 )
         
         if self.segments[0].animation_progress >= 1.0:
+            if self.turn_queue:
+                self.direction, applied_turn = self.turn_queue.popleft()
+                if self.direction[1] == 0:
+                    self.heading = self.direction
+                
             head = self.segments[0]
             new_head_pos = (
                 head.target_position[0] + self.direction[0],
@@ -113,33 +229,45 @@ class Snake:
                 self.segments.append(SnakeSegment(prev_pos, prev_dir))
                 self.grow_pending -= 1
                 self.length += 1
+            else:
+                self.occupied.clear(prev_pos)
+                
+            # The old tail cell is already free, so following the tail is allowed
+            self.hit_self = self.occupied.test(new_head_pos)
+            self.occupied.set(new_head_pos)
+                
+        return applied_turn
             
-    def change_direction(self, new_dir):
-        if (new_dir[0] * -1, new_dir[1] * -1, new_dir[2] * -1) != self.direction:
-            self.direction = new_dir
+    def queued_direction(self):
+        return self.turn_queue[-1][0] if self.turn_queue else self.direction
+        
+    def queued_heading(self):
+        for direction, _ in reversed(self.turn_queue):
+            if direction[1] == 0:
+                return direction
+        return self.heading
+        
+    def change_direction(self, new_dir, key_event=None):
+        # Turns are checked against the last queued direction, not the one being moved in
+        last_dir = self.queued_direction()
+        if new_dir == last_dir or len(self.turn_queue) >= MAX_QUEUED_TURNS:
+            return
+        if (new_dir[0] * -1, new_dir[1] * -1, new_dir[2] * -1) != last_dir:
+            self.turn_queue.append((new_dir, key_event))
             
     def grow(self, amount):
         self.grow_pending += amount
         
-    def check_collision(self, obstacles):
-        for segment in self.segments:
-            seg_pos = segment.target_position
-            
-            if (abs(seg_pos[0]) >= GRID_SIZE // 2 or 
-                abs(seg_pos[1]) >= GRID_SIZE // 2 or 
-                abs(seg_pos[2]) >= GRID_SIZE // 2):
-                return True
-                
-            for obstacle in obstacles:
-                if obstacle.check_collision(seg_pos):
-                    return True
-        
+    def check_collision(self, is_blocked):
+        # Only the head enters new cells; obstacles moving into the body are
+        # caught by Game.update_obstacles
         head_pos = self.segments[0].target_position
-        for segment in self.segments[1:]:
-            if segment.target_position == head_pos:
-                return True
-                
-        return False
+        if (abs(head_pos[0]) >= GRID_SIZE // 2 or 
+            abs(head_pos[1]) >= GRID_SIZE // 2 or 
+            abs(head_pos[2]) >= GRID_SIZE // 2):
+            return True
+            
+        return self.hit_self or is_blocked(head_pos)
         
     def apply_food_effect(self, food_type):
         current_time = time.time()
@@ -160,11 +288,20 @@ class Snake:
             self.current_color = (0.6, 0.2, 0.8)
         elif food_type == POISON_FOOD:
             if self.length > 3:
+                for segment in self.segments[-2:]:
+                    self.occupied.clear(segment.target_position)
                 self.segments = self.segments[:-2]
                 self.length -= 2
             self.current_color = (0.0, 1.0, 0.0)
             self.color_change_time = current_time + COLOR_CHANGE_DURATION
 
+def random_cell(volumetric=False):
+    return (
+        random.randint(-GRID_SIZE//2 + 1, GRID_SIZE//2 - 1),
+        random.randint(-GRID_SIZE//2 + 1, GRID_SIZE//2 - 1) if volumetric else 0,
+        random.randint(-GRID_SIZE//2 + 1, GRID_SIZE//2 - 1)
+    )
+
 class Food:
     def __init__(self):
         self.position = (0, 0, 0)
@@ -174,22 +311,11 @@ class Food:
         self.active = False
         self.rotation = 0
         
-    def spawn(self, snake_segments, obstacles):
+    def spawn(self, is_free, volumetric=False):
         while True:
-            self.position = (
-                random.randint(-GRID_SIZE//2 + 1, GRID_SIZE//2 - 1),
-                0,
-                random.randint(-GRID_SIZE//2 + 1, GRID_SIZE//2 - 1)
-            )
-            
-            occupied = any(seg.target_position == self.position for seg in snake_segments)
-            if occupied:
-                continue
-                
-            if any(obs.position == self.position and obs.is_active for obs in obstacles):
-                continue
-                
-            break
+            self.position = random_cell(volumetric)
+            if is_free(self.position):
+                break
             
         rand = random.random()
         if rand < 0.6:
@@ -221,15 +347,16 @@ class Food:
             return False
         return time.time() > self.spawn_time + self.duration
         
-    def draw(self):
-        if not self.active:
-            return
-            
+    def snapshot(self):
+        return FoodState(self.position, self.type, self.rotation)
+        
+    @staticmethod
+    def draw(state):
         glPushMatrix()
-        glTranslatef(*self.position)
-        glRotatef(self.rotation, 0, 1, 0)
+        glTranslatef(*state.position)
+        glRotatef(state.rotation, 0, 1, 0)
         
-        if self.type == NORMAL_FOOD:
+        if state.type == NORMAL_FOOD:
             glColor3f(1.0, 0.0, 0.0)
             glutSolidSphere(0.4, 16, 16)
             glColor3f(1.0, 1.0, 1.0)
@@ -237,7 +364,7 @@ class Food:
             glTranslatef(0.3, 0.3, 0.3)
             glutSolidSphere(0.1, 8, 8)
             glPopMatrix()
-        elif self.type == GOLDEN_FOOD:
+        elif state.type == GOLDEN_FOOD:
             glColor3f(0.9, 0.8, 0.1)
             glBegin(GL_TRIANGLE_FAN)
             glVertex3f(0, 0.6, 0)
@@ -250,7 +377,7 @@ class Food:
                 glVertex3f(outer_x, 0.1, outer_z)
                 glVertex3f(inner_x, 0.3, inner_z)
             glEnd()
-        elif self.type == SPEED_FOOD:
+        elif state.type == SPEED_FOOD:
             glColor3f(0.0, 0.0, 1.0)
             glBegin(GL_TRIANGLES)
             glVertex3f(0, 0.5, 0)
@@ -264,7 +391,7 @@ class Food:
             glVertex3f(-0.3, -0.2, 0)
             glVertex3f(0, -0.5, 0)
             glEnd()
-        elif self.type == SLOW_FOOD:
+        elif state.type == SLOW_FOOD:
             glColor3f(0.6, 0.2, 0.8)
             glBegin(GL_TRIANGLE_FAN)
             glVertex3f(0, 0.5, 0)
@@ -284,7 +411,7 @@ class Food:
             glVertex3f(0.2, 0.0, 0.2)
             glVertex3f(-0.2, 0.0, 0.2)
             glEnd()
-        elif self.type == POISON_FOOD:
+        elif state.type == POISON_FOOD:
             glColor3f(0.0, 1.0, 0.0)
             glutSolidSphere(0.4, 16, 16)
             glColor3f(0.2, 0.2, 0.2)
@@ -305,7 +432,7 @@ class Food:
         glPopMatrix()
 
 class Obstacle:
-    def __init__(self, position, difficulty, is_boundary=False):
+    def __init__(self, position, difficulty, is_boundary=False, volumetric=False):
         self.position = list(position)
         self.difficulty = difficulty
         self.is_boundary = is_boundary
@@ -323,9 +450,10 @@ class Obstacle:
         self.origin = list(position)
         self.pulse_factor = 0.0
         self.pulse_speed = random.uniform(0.05, 0.1)
+        self.cells = []  # Grid cells currently covered, see covered_cells()
         
         if difficulty == HARD and not is_boundary:
-            axis = random.choice([0, 2])  # X or Z axis
+            axis = random.choice([0, 1, 2] if volumetric else [0, 2])
             self.move_direction[axis] = random.choice([-1, 1])
             self.move_speed = random.uniform(0.04, 0.06)
             self.move_range = random.uniform(3.0, 4.0)
@@ -336,20 +464,17 @@ class Obstacle:
             
             new_pos = [
                 self.position[0] + self.move_direction[0] * self.move_speed,
-                self.position[1],
+                self.position[1] + self.move_direction[1] * self.move_speed,
                 self.position[2] + self.move_direction[2] * self.move_speed
             ]
             
             boundary_min = -GRID_SIZE//2 + 1
             boundary_max = GRID_SIZE//2 - 1
             
-            if new_pos[0] < boundary_min or new_pos[0] > boundary_max:
-                self.move_direction[0] *= -1
-                new_pos[0] = max(boundary_min, min(boundary_max, new_pos[0]))
-                
-            if new_pos[2] < boundary_min or new_pos[2] > boundary_max:
-                self.move_direction[2] *= -1
-                new_pos[2] = max(boundary_min, min(boundary_max, new_pos[2]))
+            for axis in range(3):
+                if new_pos[axis] < boundary_min or new_pos[axis] > boundary_max:
+                    self.move_direction[axis] *= -1
+                    new_pos[axis] = max(boundary_min, min(boundary_max, new_pos[axis]))
             
             self.position = new_pos
         
@@ -358,47 +483,596 @@ class Obstacle:
             return False
             
         dx = position[0] - self.position[0]
+        dy = position[1] - self.position[1]
         dz = position[2] - self.position[2]
-        distance = math.sqrt(dx*dx + dz*dz)
+        distance = math.sqrt(dx*dx + dy*dy + dz*dz)
         return distance < 0.8
         
-    def draw(self):
+    def covered_cells(self):
+        # Every grid cell check_collision would report a hit for
         if not self.is_active:
-            return
-            
+            return []
+        x_range, y_range, z_range = (
+            range(math.ceil(c - 0.8), math.floor(c + 0.8) + 1) for c in self.position
+        )
+        return [
+            (x, y, z) for x in x_range for y in y_range for z in z_range
+            if self.check_collision((x, y, z))
+        ]
+        
+    def snapshot(self):
+        return ObstacleState(
+            tuple(self.position),
+            self.rotation,
+            self.scale,
+            self.color,
+            self.pulse_factor,
+            tuple(self.move_direction),
+            self.difficulty == HARD and not self.is_boundary
+        )
+        
+    @staticmethod
+    def draw(state):
         glPushMatrix()
-        glTranslatef(*self.position)
-        glRotatef(self.rotation, 0, 1, 0)
-        glScalef(self.scale, self.scale, self.scale)
+        glTranslatef(*state.position)
+        glRotatef(state.rotation, 0, 1, 0)
+        glScalef(state.scale, state.scale, state.scale)
         
-        if self.difficulty == HARD and not self.is_boundary:
+        if state.moving:
             pulse_color = (
-                min(1.0, self.color[0] + self.pulse_factor * 0.3),
-                max(0.2, self.color[1] - self.pulse_factor * 0.2),
-                self.color[2]
+                min(1.0, state.color[0] + state.pulse_factor * 0.3),
+                max(0.2, state.color[1] - state.pulse_factor * 0.2),
+                state.color[2]
             )
             glColor3f(*pulse_color)
         else:
-            glColor3f(*self.color)
+            glColor3f(*state.color)
             
         glutSolidCube(0.9)
         glColor3f(0.7, 0.7, 0.7)
         glLineWidth(2.0)
         glutWireCube(0.91)
         
-        if self.difficulty == HARD and not self.is_boundary:
+        if state.moving:
             glPushMatrix()
             glTranslatef(0, 0.6, 0)
             glColor3f(1.0, 0.0, 0.0)
-            if self.move_direction[0] != 0:
-                glRotatef(90 if self.move_direction[0] > 0 else -90, 0, 0, 1)
+            if state.move_direction[0] != 0:
+                glRotatef(90 if state.move_direction[0] > 0 else -90, 0, 0, 1)
             else:
-                glRotatef(0 if self.move_direction[2] > 0 else 180, 0, 1, 0)
+                glRotatef(0 if state.move_direction[2] > 0 else 180, 0, 1, 0)
             glutSolidCone(0.15, 0.3, 8, 1)
             glPopMatrix()
         
         glPopMatrix()
 
+def arena_floor_y(volumetric):
+    # The flat arena plays on y=0; the volume sits on top of its lowest cell layer
+    return -GRID_SIZE//2 + 0.5 if volumetric else -0.5
+
+class LegacyRenderer:
+    # Fixed-function immediate mode renderer
+    def draw_world(self, snap):
+        floor_y = arena_floor_y(snap.volumetric)
+        glColor3f(0.4, 0.8, 0.4)
+        glBegin(GL_QUADS)
+        glVertex3f(-GRID_SIZE//2, floor_y, -GRID_SIZE//2)
+        glVertex3f(GRID_SIZE//2, floor_y, -GRID_SIZE//2)
+        glVertex3f(GRID_SIZE//2, floor_y, GRID_SIZE//2)
+        glVertex3f(-GRID_SIZE//2, floor_y, GRID_SIZE//2)
+        glEnd()
+        
+        if snap.volumetric:
+            glColor3f(0.7, 0.7, 0.7)
+            glLineWidth(1.0)
+            glutWireCube(ARENA_BOX_SIZE)
+        
+        for i, segment in enumerate(snap.segments):
+            glPushMatrix()
+            pos = segment.position
+            glTranslatef(*pos)
+            dx, dy, dz = segment.direction
+            if dx != 0 or dz != 0:
+                angle = math.degrees(math.atan2(dx, dz))
+                glRotatef(angle, 0, 1, 0)
+            
+            if i == 0:
+                glColor3f(*snap.snake_color)
+                glutSolidSphere(0.5, 16, 16)
+                glColor3f(1.0, 1.0, 1.0)
+                glPushMatrix()
+                glTranslatef(0.2, 0.2, 0.3)
+                glutSolidSphere(0.1, 8, 8)
+                glTranslatef(-0.4, 0, 0)
+                glutSolidSphere(0.1, 8, 8)
+                glPopMatrix()
+            else:
+                size = 0.4 * (0.9 + 0.1 * (i / len(snap.segments)))
+                color_factor = 0.7 + 0.3 * (i / len(snap.segments))
+                glColor3f(
+                    snap.snake_color[0] * color_factor,
+                    snap.snake_color[1] * color_factor,
+                    snap.snake_color[2] * color_factor
+                )
+                glutSolidSphere(size, 12, 12)
+            glPopMatrix()
+            
+        for food in snap.foods:
+            Food.draw(food)
+            
+        for obstacle in snap.obstacles:
+            Obstacle.draw(obstacle)
+
+# Shader renderer geometry: every vertex is position, normal, RGB colour and a
+# tint weight that blends in the per-instance colour (1.0 = fully tinted)
+VERTEX_FLOATS = 10
+# Per-instance data: offset, yaw, RGB colour, scale, pulse factor, heading
+INSTANCE_FLOATS = 10
+
+def add_vertex(data, position, normal, color, tint):
+    data.extend(position)
+    data.extend(normal)
+    data.extend(color)
+    data.append(tint)
+
+def face_normal(a, b, c):
+    u = (b[0] - a[0], b[1] - a[1], b[2] - a[2])
+    v = (c[0] - a[0], c[1] - a[1], c[2] - a[2])
+    n = (u[1]*v[2] - u[2]*v[1], u[2]*v[0] - u[0]*v[2], u[0]*v[1] - u[1]*v[0])
+    length = math.sqrt(n[0]**2 + n[1]**2 + n[2]**2)
+    if length == 0:
+        return (0, 1, 0)
+    return (n[0]/length, n[1]/length, n[2]/length)
+
+def triangles_mesh(points, color, tint=0.0):
+    data = []
+    for i in range(0, len(points) - 2, 3):
+        a, b, c = points[i], points[i + 1], points[i + 2]
+        normal = face_normal(a, b, c)
+        for p in (a, b, c):
+            add_vertex(data, p, normal, color, tint)
+    return data
+
+def fan_to_triangles(points):
+    triangles = []
+    for i in range(1, len(points) - 1):
+        triangles.extend((points[0], points[i], points[i + 1]))
+    return triangles
+
+def sphere_mesh(radius, slices, stacks, color=(1.0, 1.0, 1.0), tint=1.0, center=(0, 0, 0)):
+    def point(i, j):
+        theta = math.pi * i / stacks
+        phi = math.pi * 2 * j / slices
+        n = (math.sin(theta) * math.cos(phi), math.cos(theta), math.sin(theta) * math.sin(phi))
+        return (center[0] + n[0] * radius, center[1] + n[1] * radius, center[2] + n[2] * radius), n
+        
+    data = []
+    for i in range(stacks):
+        for j in range(slices):
+            quad = [point(i, j), point(i + 1, j), point(i + 1, j + 1), point(i, j + 1)]
+            for position, normal in (quad[0], quad[1], quad[2], quad[0], quad[2], quad[3]):
+                add_vertex(data, position, normal, color, tint)
+    return data
+
+def cube_mesh(size, color=(1.0, 1.0, 1.0), tint=1.0, center=(0, 0, 0)):
+    h = size / 2
+    data = []
+    for axis in range(3):
+        for sign in (-1, 1):
+            normal = [0, 0, 0]
+            normal[axis] = sign
+            u_axis, v_axis = [a for a in range(3) if a != axis]
+            corners = []
+            for u, v in ((-1, -1), (1, -1), (1, 1), (-1, 1)):
+                p = [0, 0, 0]
+                p[axis] = sign * h
+                p[u_axis] = u * h
+                p[v_axis] = v * h
+                corners.append((center[0] + p[0], center[1] + p[1], center[2] + p[2]))
+            for p in (corners[0], corners[1], corners[2], corners[0], corners[2], corners[3]):
+                add_vertex(data, p, normal, color, tint)
+    return data
+
+def wire_cube_mesh(size, color):
+    h = size / 2
+    data = []
+    corners = [(x, y, z) for x in (-h, h) for y in (-h, h) for z in (-h, h)]
+    for a in range(len(corners)):
+        for b in range(a + 1, len(corners)):
+            # Edges join corners that differ along exactly one axis
+            if sum(corners[a][k] != corners[b][k] for k in range(3)) == 1:
+                add_vertex(data, corners[a], (0, 1, 0), color, 0.0)
+                add_vertex(data, corners[b], (0, 1, 0), color, 0.0)
+    return data
+
+def cone_mesh(base, height, slices, color, center=(0, 0, 0)):
+    # Points along +Z like glutSolidCone
+    tip = (center[0], center[1], center[2] + height)
+    ring = [
+        (center[0] + math.cos(math.pi * 2 * i / slices) * base,
+         center[1] + math.sin(math.pi * 2 * i / slices) * base,
+         center[2])
+        for i in range(slices + 1)
+    ]
+    points = []
+    for i in range(slices):
+        points.extend((ring[i], ring[i + 1], tip))
+        points.extend((center, ring[i + 1], ring[i]))
+    return triangles_mesh(points, color)
+
+def build_meshes():
+    half = GRID_SIZE // 2
+    floor = [(-half, -0.5, -half), (-half, -0.5, half), (half, -0.5, half), (half, -0.5, -half)]
+    
+    golden = [(0, 0.6, 0)]
+    for i in range(6):
+        angle = math.pi * 2 * i / 5
+        golden.append((math.sin(angle) * 0.5, 0.1, math.cos(angle) * 0.5))
+        golden.append((math.sin(angle + math.pi/5) * 0.2, 0.3, math.cos(angle + math.pi/5) * 0.2))
+        
+    # The legacy arrow's third triangle has zero area, so it is left out
+    speed = [
+        (0, 0.5, 0), (-0.2, 0.2, 0), (0.2, 0.2, 0),
+        (0.2, 0.2, 0), (-0.2, 0.2, 0), (-0.3, -0.2, 0)
+    ]
+    
+    ring = [math.pi * 2 * i / 4 for i in range(5)]
+    slow = fan_to_triangles([(0, 0.5, 0)] + [(math.sin(a) * 0.3, 0.2, math.cos(a) * 0.3) for a in ring])
+    # Counter-clockwise seen from outside so the face normals point outwards
+    slow += fan_to_triangles([(0, -0.5, 0)] + [(math.sin(a) * 0.3, -0.2, math.cos(a) * 0.3) for a in reversed(ring)])
+    slow += fan_to_triangles([(-0.2, 0.0, -0.2), (-0.2, 0.0, 0.2), (0.2, 0.0, 0.2), (0.2, 0.0, -0.2)])
+    
+    poison = sphere_mesh(0.4, 16, 16, (0.0, 1.0, 0.0), 0.0)
+    poison += sphere_mesh(0.1, 8, 8, (0.2, 0.2, 0.2), 0.0, (-0.15, 0.1, 0.35))
+    poison += sphere_mesh(0.1, 8, 8, (0.2, 0.2, 0.2), 0.0, (0.15, 0.1, 0.35))
+    for i in range(4):
+        poison += cube_mesh(0.1, (1.0, 1.0, 1.0), 0.0, (i * 0.15 - 0.225, -0.3, 0.35))
+        
+    return {
+        'floor': (GL_TRIANGLES, triangles_mesh(fan_to_triangles(floor), (0.4, 0.8, 0.4))),
+        'snake_head': (GL_TRIANGLES,
+                       sphere_mesh(0.5, 16, 16)
+                       + sphere_mesh(0.1, 8, 8, (1.0, 1.0, 1.0), 0.0, (0.2, 0.2, 0.3))
+                       + sphere_mesh(0.1, 8, 8, (1.0, 1.0, 1.0), 0.0, (-0.2, 0.2, 0.3))),
+        'snake_body': (GL_TRIANGLES, sphere_mesh(1.0, 12, 12)),
+        'food_normal': (GL_TRIANGLES,
+                        sphere_mesh(0.4, 16, 16, (1.0, 0.0, 0.0), 0.0)
+                        + sphere_mesh(0.1, 8, 8, (1.0, 1.0, 1.0), 0.0, (0.3, 0.3, 0.3))),
+        'food_golden': (GL_TRIANGLES, triangles_mesh(fan_to_triangles(golden), (0.9, 0.8, 0.1))),
+        'food_speed': (GL_TRIANGLES, triangles_mesh(speed, (0.0, 0.0, 1.0))),
+        'food_slow': (GL_TRIANGLES, triangles_mesh(slow, (0.6, 0.2, 0.8))),
+        'food_poison': (GL_TRIANGLES, poison),
+        'obstacle': (GL_TRIANGLES, cube_mesh(0.9)),
+        'obstacle_wire': (GL_LINES, wire_cube_mesh(0.91, (0.7, 0.7, 0.7))),
+        'obstacle_arrow': (GL_TRIANGLES, cone_mesh(0.15, 0.3, 8, (1.0, 0.0, 0.0), (0, 0.6, 0))),
+        'arena_box': (GL_LINES, wire_cube_mesh(ARENA_BOX_SIZE, (0.7, 0.7, 0.7))),
+    }
+
+def mesh_cache_key():
+    # Editing any mesh builder, or the arena size, invalidates the cache. The
+    # builders' compiled code is hashed, which is cheaper than re-reading the source.
+    digest = hashlib.sha1(repr((GRID_SIZE, ARENA_BOX_SIZE, VERTEX_FLOATS)).encode())
+    for builder in (add_vertex, face_normal, triangles_mesh, fan_to_triangles, sphere_mesh,
+                    cube_mesh, wire_cube_mesh, cone_mesh, build_meshes):
+        digest.update(marshal.dumps(builder.__code__))
+    return digest.digest()
+
+def read_mesh_cache(key):
+    # Layout: magic, key, mesh count, then per mesh a (name length, GL mode,
+    # float count) header, the name and the packed floats
+    with open(ASSET_CACHE_PATH, 'rb') as cache:
+        if cache.read(len(ASSET_CACHE_MAGIC)) != ASSET_CACHE_MAGIC or cache.read(len(key)) != key:
+            return None
+        meshes = {}
+        (count,) = struct.unpack('<I', cache.read(4))
+        for _ in range(count):
+            name_length, mode, float_count = struct.unpack('<HII', cache.read(10))
+            name = cache.read(name_length).decode('utf-8')
+            data = array.array('f')
+            data.fromfile(cache, float_count)
+            meshes[name] = (mode, data)
+        return meshes
+
+def write_mesh_cache(key, meshes):
+    directory = os.path.dirname(ASSET_CACHE_PATH)
+    os.makedirs(directory, exist_ok=True)
+    # Write beside the cache and swap it in, so an interrupted write never leaves a truncated file
+    with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) as cache:
+        try:
+            cache.write(ASSET_CACHE_MAGIC)
+            cache.write(key)
+            cache.write(struct.pack('<I', len(meshes)))
+            for name, (mode, data) in meshes.items():
+                encoded = name.encode('utf-8')
+                cache.write(struct.pack('<HII', len(encoded), mode, len(data)))
+                cache.write(encoded)
+                data.tofile(cache)
+        except BaseException:
+            cache.close()
+            os.remove(cache.name)
+            raise
+    os.replace(cache.name, ASSET_CACHE_PATH)
+
+def load_meshes():
+    # Meshes are cached on disk as packed float arrays
+    key = mesh_cache_key()
+    try:
+        meshes = read_mesh_cache(key)
+        if meshes is not None:
+            return meshes
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, struct.error):
+        pass
+        
+    meshes = {name: (int(mode), array.array('f', data)) for name, (mode, data) in build_meshes().items()}
+    try:
+        write_mesh_cache(key, meshes)
+    except OSError as error:
+        print(f"Could not write asset cache: {error}")
+    return meshes
+
+FOOD_MESHES = {
+    NORMAL_FOOD: 'food_normal',
+    GOLDEN_FOOD: 'food_golden',
+    SPEED_FOOD: 'food_speed',
+    SLOW_FOOD: 'food_slow',
+    POISON_FOOD: 'food_poison',
+}
+
+def direction_yaw(direction):
+    if direction[0] != 0 or direction[2] != 0:
+        return math.degrees(math.atan2(direction[0], direction[2]))
+    return 0.0
+
+class ShaderRenderer:
+    # GLSL renderer: static meshes live in GPU buffers and each object class
+    # (snake, foods, obstacles) uploads its per-frame instance data in one write
+    VERTEX_SHADER = """
+        #version 130
+        in vec3 a_position;
+        in vec3 a_normal;
+        in vec4 a_color;
+        in vec4 i_offset_yaw;
+        in vec4 i_color_scale;
+        in vec2 i_pulse_heading;
+        uniform mat4 u_view;
+        uniform mat4 u_projection;
+        uniform float u_use_heading;
+        out vec3 v_eye_position;
+        out vec3 v_normal;
+        out vec3 v_color;
+        void main() {
+            float yaw = radians(mix(i_offset_yaw.w, i_pulse_heading.y, u_use_heading));
+            mat3 rotation = mat3(cos(yaw), 0.0, -sin(yaw),
+                                 0.0, 1.0, 0.0,
+                                 sin(yaw), 0.0, cos(yaw));
+            vec3 world = i_offset_yaw.xyz + rotation * (a_position * i_color_scale.w);
+            vec4 eye = u_view * vec4(world, 1.0);
+            
+            vec3 color = i_color_scale.rgb;
+            if (i_pulse_heading.x >= 0.0) {
+                float pulse = i_pulse_heading.x;
+                color = vec3(min(1.0, color.r + pulse * 0.3), max(0.2, color.g - pulse * 0.2), color.b);
+            }
+            
+            v_eye_position = eye.xyz;
+            v_normal = mat3(u_view) * rotation * a_normal;
+            v_color = mix(a_color.rgb, a_color.rgb * color, a_color.a);
+            gl_Position = u_projection * eye;
+        }
+    """
+    
+    FRAGMENT_SHADER = """
+        #version 130
+        in vec3 v_eye_position;
+        in vec3 v_normal;
+        in vec3 v_color;
+        uniform vec3 u_light_position;
+        uniform float u_lit;
+        out vec4 frag_color;
+        void main() {
+            // Same one-sided light as init(): ambient 0.3 plus the 0.2 global ambient,
+            // white diffuse and specular, no highlight on faces turned away from the light
+            vec3 n = normalize(v_normal);
+            vec3 l = normalize(u_light_position - v_eye_position);
+            float diffuse = max(dot(n, l), 0.0);
+            float specular = 0.0;
+            if (diffuse > 0.0) {
+                specular = pow(max(dot(n, normalize(l + vec3(0.0, 0.0, 1.0))), 0.0), 50.0);
+            }
+            vec3 lit = v_color * (0.5 + diffuse) + vec3(specular);
+            frag_color = vec4(mix(v_color, lit, u_lit), 1.0);
+        }
+    """
+    
+    ATTRIBUTES = ['a_position', 'a_normal', 'a_color', 'i_offset_yaw', 'i_color_scale', 'i_pulse_heading']
+    
+    def __init__(self):
+        version = glGetString(GL_VERSION).decode('utf-8', 'replace')
+        major, minor = (int(part) for part in version.split()[0].split('.')[:2])
+        if (major, minor) < (3, 3):
+            raise RuntimeError(f"OpenGL 3.3 required for instancing, got {version}")
+            
+        self.program = self.build_program()
+        self.uniforms = {
+            name: glGetUniformLocation(self.program, name)
+            for name in ('u_view', 'u_projection', 'u_use_heading', 'u_light_position', 'u_lit')
+        }
+        
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+        for location in range(len(self.ATTRIBUTES)):
+            glEnableVertexAttribArray(location)
+        for location in (3, 4, 5):
+            glVertexAttribDivisor(location, 1)
+        glBindVertexArray(0)
+        
+        self.meshes = {}
+        for name, (mode, data) in load_meshes().items():
+            self.meshes[name] = (mode, self.upload(glGenBuffers(1), data, GL_STATIC_DRAW),
+                                 len(data) // VERTEX_FLOATS)
+            
+        # The static 'arena' buffer holds the flat floor, then the volume floor
+        self.instance_buffers = {name: glGenBuffers(1) for name in ('arena', 'snake', 'food', 'obstacle')}
+        self.upload(self.instance_buffers['arena'], [
+            0, 0, 0, 0, 1, 1, 1, 1, -1, 0,
+            0, arena_floor_y(True) + 0.5, 0, 0, 1, 1, 1, 1, -1, 0
+        ], GL_STATIC_DRAW)
+        
+    def compile_shader(self, kind, source):
+        shader = glCreateShader(kind)
+        glShaderSource(shader, source.strip())
+        glCompileShader(shader)
+        if not glGetShaderiv(shader, GL_COMPILE_STATUS):
+            raise RuntimeError(glGetShaderInfoLog(shader).decode('utf-8', 'replace'))
+        return shader
+        
+    def build_program(self):
+        program = glCreateProgram()
+        glAttachShader(program, self.compile_shader(GL_VERTEX_SHADER, self.VERTEX_SHADER))
+        glAttachShader(program, self.compile_shader(GL_FRAGMENT_SHADER, self.FRAGMENT_SHADER))
+        for location, name in enumerate(self.ATTRIBUTES):
+            glBindAttribLocation(program, location, name)
+        glLinkProgram(program)
+        if not glGetProgramiv(program, GL_LINK_STATUS):
+            raise RuntimeError(glGetProgramInfoLog(program).decode('utf-8', 'replace'))
+        return program
+        
+    def upload(self, buffer, data, usage):
+        if not isinstance(data, array.array):
+            data = array.array('f', data)
+        floats = (ctypes.c_float * len(data)).from_buffer(data)
+        glBindBuffer(GL_ARRAY_BUFFER, buffer)
+        glBufferData(GL_ARRAY_BUFFER, ctypes.sizeof(floats), floats, usage)
+        return buffer
+        
+    def draw_instances(self, mesh_name, buffer_name, first, count):
+        if count <= 0:
+            return
+        mode, vertex_buffer, vertex_count = self.meshes[mesh_name]
+        
+        stride = VERTEX_FLOATS * 4
+        glBindBuffer(GL_ARRAY_BUFFER, vertex_buffer)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(0))
+        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(12))
+        glVertexAttribPointer(2, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(24))
+        
+        stride = INSTANCE_FLOATS * 4
+        base = first * stride
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffers[buffer_name])
+        glVertexAttribPointer(3, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(base))
+        glVertexAttribPointer(4, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(base + 16))
+        glVertexAttribPointer(5, 2, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(base + 32))
+        
+        glDrawArraysInstanced(mode, 0, vertex_count, count)
+        
+    def draw_world(self, snap):
+        # The camera is still set up on the fixed-function matrix stacks
+        view = glGetFloatv(GL_MODELVIEW_MATRIX)
+        projection = glGetFloatv(GL_PROJECTION_MATRIX)
+        
+        glUseProgram(self.program)
+        glBindVertexArray(self.vao)
+        glUniformMatrix4fv(self.uniforms['u_view'], 1, GL_FALSE, view)
+        glUniformMatrix4fv(self.uniforms['u_projection'], 1, GL_FALSE, projection)
+        glUniform3f(self.uniforms['u_light_position'], 5, 10, 5)
+        glUniform1f(self.uniforms['u_use_heading'], 0.0)
+        glUniform1f(self.uniforms['u_lit'], 1.0)
+        
+        self.draw_instances('floor', 'arena', 1 if snap.volumetric else 0, 1)
+        if snap.volumetric:
+            glUniform1f(self.uniforms['u_lit'], 0.0)
+            glLineWidth(1.0)
+            self.draw_instances('arena_box', 'arena', 0, 1)
+            glUniform1f(self.uniforms['u_lit'], 1.0)
+        
+        instances = []
+        segment_count = len(snap.segments)
+        for i, segment in enumerate(snap.segments):
+            if i == 0:
+                color, size = snap.snake_color, 1.0
+            else:
+                size = 0.4 * (0.9 + 0.1 * (i / segment_count))
+                color_factor = 0.7 + 0.3 * (i / segment_count)
+                color = tuple(c * color_factor for c in snap.snake_color)
+            instances.extend(segment.position)
+            instances.append(direction_yaw(segment.direction))
+            instances.extend(color)
+            instances.extend((size, -1, 0))
+        self.upload(self.instance_buffers['snake'], instances, GL_STREAM_DRAW)
+        self.draw_instances('snake_head', 'snake', 0, 1)
+        self.draw_instances('snake_body', 'snake', 1, segment_count - 1)
+        
+        foods = sorted(snap.foods, key=lambda food: food.type)
+        instances = []
+        for food in foods:
+            instances.extend(food.position)
+            instances.extend((food.rotation, 1, 1, 1, 1, -1, 0))
+        self.upload(self.instance_buffers['food'], instances, GL_STREAM_DRAW)
+        first = 0
+        for food_type, mesh_name in FOOD_MESHES.items():
+            count = sum(1 for food in foods if food.type == food_type)
+            self.draw_instances(mesh_name, 'food', first, count)
+            first += count
+            
+        # Moving obstacles go last so their arrows can be drawn as one range
+        obstacles = sorted(snap.obstacles, key=lambda obstacle: obstacle.moving)
+        instances = []
+        for obstacle in obstacles:
+            instances.extend(obstacle.position)
+            instances.append(obstacle.rotation)
+            instances.extend(obstacle.color)
+            instances.append(obstacle.scale)
+            instances.append(obstacle.pulse_factor if obstacle.moving else -1)
+            instances.append(direction_yaw(obstacle.move_direction))
+        self.upload(self.instance_buffers['obstacle'], instances, GL_STREAM_DRAW)
+        moving = sum(1 for obstacle in obstacles if obstacle.moving)
+        self.draw_instances('obstacle', 'obstacle', 0, len(obstacles))
+        glUniform1f(self.uniforms['u_lit'], 0.0)
+        glLineWidth(2.0)
+        self.draw_instances('obstacle_wire', 'obstacle', 0, len(obstacles))
+        glUniform1f(self.uniforms['u_lit'], 1.0)
+        glUniform1f(self.uniforms['u_use_heading'], 1.0)
+        self.draw_instances('obstacle_arrow', 'obstacle', len(obstacles) - moving, moving)
+        
+        # Hand the pipeline back to fixed function for the HUD text
+        glBindVertexArray(0)
+        glUseProgram(0)
+
+def create_renderer(name):
+    if name == RENDERER_SHADER:
+        try:
+            return ShaderRenderer()
+        except (RuntimeError, ValueError, GLError) as error:
+            print(f"Shader renderer unavailable, using legacy renderer: {error}")
+    return LegacyRenderer()
+
+class InputLatencyStats:
+    def __init__(self):
+        self.samples = {}  # camera mode -> key-to-frame latencies in seconds
+        
+    def record(self, camera_mode, latency):
+        self.samples.setdefault(camera_mode, []).append(latency)
+        
+    def mean(self, camera_mode):
+        samples = self.samples.get(camera_mode)
+        if not samples:
+            return None
+        return sum(samples) / len(samples)
+        
+    def report(self):
+        lines = ["Input latency (key press to rendered turn):"]
+        for mode, name in enumerate(CAMERA_MODES):
+            samples = sorted(self.samples.get(mode, []))
+            if not samples:
+                lines.append(f"  {name}: no turns")
+                continue
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            lines.append(
+                f"  {name}: {len(samples)} turns, mean {self.mean(mode) * 1000:.1f} ms, "
+                f"p95 {p95 * 1000:.1f} ms, max {samples[-1] * 1000:.1f} ms"
+            )
+        return "\n".join(lines)
+
 class Game:
     def __init__(self):
         self.snake = Snake()
@@ -414,24 +1088,44 @@ class Game:
         self.camera_angle_y = 45
         self.camera_distance = 15
         self.difficulty = EASY
+        self.volumetric = False  # Full 3D arena with up/down turns
+        self.static_cells = OccupancyVolume(GRID_SIZE)
+        self.moving_cells = OccupancyVolume(GRID_SIZE)
         self.selecting_difficulty = True
         self.last_obstacle_move = 0
         self.obstacle_move_interval = 0.02
+        self.commands = deque()  # Filled by GLUT callbacks, drained by the simulation thread
+        self.snapshots = [None, None]
+        self.front_snapshot = 0
+        self.drawn_snapshot = None
+        self.tick_count = 0
+        self.shown_turns = deque()  # (tick, (key_time, camera_mode)) of turns awaiting a frame
+        self.turn_awaiting_animation = None  # Stepped turn whose head has not started moving yet
+        self.latency_stats = InputLatencyStats()
+        self.renderer = LegacyRenderer()
+        self.startup_reported = False
+        self.running = False
+        self.sim_thread = None
         
     def generate_obstacles(self):
         self.obstacles = []
+        self.static_cells.reset()
+        self.moving_cells.reset()
         
-        wall_color = (1.0, 0.0, 0.0)
-        for x in range(-GRID_SIZE//2, GRID_SIZE//2 + 1):
-            for z in [-GRID_SIZE//2, GRID_SIZE//2]:
-                obstacle = Obstacle((x, 0, z), self.difficulty, is_boundary=True)
-                obstacle.color = wall_color
-                self.obstacles.append(obstacle)
-        for z in range(-GRID_SIZE//2 + 1, GRID_SIZE//2):
-            for x in [-GRID_SIZE//2, GRID_SIZE//2]:
-                obstacle = Obstacle((x, 0, z), self.difficulty, is_boundary=True)
-                obstacle.color = wall_color
-                self.obstacles.append(obstacle)
+        # Walls sit outside the interior, the snake's bounds check covers them.
+        # The 3D arena is drawn as a wireframe box instead.
+        if not self.volumetric:
+            wall_color = (1.0, 0.0, 0.0)
+            for x in range(-GRID_SIZE//2, GRID_SIZE//2 + 1):
+                for z in [-GRID_SIZE//2, GRID_SIZE//2]:
+                    obstacle = Obstacle((x, 0, z), self.difficulty, is_boundary=True)
+                    obstacle.color = wall_color
+                    self.obstacles.append(obstacle)
+            for z in range(-GRID_SIZE//2 + 1, GRID_SIZE//2):
+                for x in [-GRID_SIZE//2, GRID_SIZE//2]:
+                    obstacle = Obstacle((x, 0, z), self.difficulty, is_boundary=True)
+                    obstacle.color = wall_color
+                    self.obstacles.append(obstacle)
     
         obstacle_count = {
             EASY: 0,
@@ -441,20 +1135,39 @@ class Game:
         
         for _ in range(obstacle_count):
             while True:
-                pos = (
-                    random.randint(-GRID_SIZE//2 + 1, GRID_SIZE//2 - 1),
-                    0,
-                    random.randint(-GRID_SIZE//2 + 1, GRID_SIZE//2 - 1)
-                )
-                if not any(seg.target_position == pos for seg in self.snake.segments) and pos != (0, 0, 0):
-                    self.obstacles.append(Obstacle(pos, self.difficulty))
+                pos = random_cell(self.volumetric)
+                if self.is_free(pos) and pos != (0, 0, 0):
+                    obstacle = Obstacle(pos, self.difficulty, volumetric=self.volumetric)
+                    self.obstacles.append(obstacle)
+                    obstacle.cells = obstacle.covered_cells()
+                    cells = self.moving_cells if obstacle.move_speed > 0 else self.static_cells
+                    for cell in obstacle.cells:
+                        cells.set(cell)
                     break
                     
+    def is_blocked(self, pos):
+        return self.static_cells.test(pos) or self.moving_cells.test(pos)
+        
+    def is_free(self, pos):
+        return not self.snake.occupied.test(pos) and not self.is_blocked(pos)
+                    
     def update_obstacles(self):
         current_time = time.time()
         if current_time - self.last_obstacle_move > self.obstacle_move_interval:
+            moving = [obstacle for obstacle in self.obstacles if obstacle.move_speed > 0]
             for obstacle in self.obstacles:
                 obstacle.update()
+                
+            # Clear every old cell before setting new ones so overlapping obstacles stay marked
+            for obstacle in moving:
+                for cell in obstacle.cells:
+                    self.moving_cells.clear(cell)
+            for obstacle in moving:
+                obstacle.cells = obstacle.covered_cells()
+                for cell in obstacle.cells:
+                    self.moving_cells.set(cell)
+                    if self.snake.occupied.test(cell):
+                        self.game_over = True
             self.last_obstacle_move = current_time
                 
     def update(self):
@@ -467,7 +1180,7 @@ class Game:
         
         if len(self.foods) < MAX_FOODS and current_time > self.next_food_spawn:
             new_food = Food()
-            new_food.spawn(self.snake.segments, self.obstacles)
+            new_food.spawn(self.is_free, self.volumetric)
             self.foods.append(new_food)
             self.next_food_spawn = current_time + random.uniform(1, 3)
             
@@ -479,11 +1192,24 @@ class Game:
         move_interval = MOVE_INTERVAL / self.snake.speed_multiplier
         if current_time - self.last_move_time > move_interval:
             if self.camera_mode != 0:  # Normal movement for other camera modes
-                self.snake.move()
+                key_event = self.snake.move()
             else:  # First-person mode - always move forward
-                self.snake.move()
+                key_event = self.snake.move()
             self.last_move_time = current_time
             
+            # A frame "shows the turn" once the camera or the drawn head reflects it.
+            # First- and Third-Person cameras follow the head's target, so that is the
+            # step snapshot. The other views draw segment.position/direction, which
+            # only start moving toward the new target on the move() after the step.
+            if self.turn_awaiting_animation is not None:
+                self.shown_turns.append((self.tick_count + 1, self.turn_awaiting_animation))
+                self.turn_awaiting_animation = None
+            if key_event is not None:
+                if self.camera_mode in (0, 1):
+                    self.shown_turns.append((self.tick_count + 1, key_event))
+                else:
+                    self.turn_awaiting_animation = key_event
+            
             head_pos = self.snake.segments[0].target_position
             for food in self.foods[:]:
                 if food.position == head_pos:
@@ -491,41 +1217,175 @@ class Game:
                     self.score += 1 if food.type == NORMAL_FOOD else 3
                     self.foods.remove(food)
                 
-            if self.snake.check_collision(self.obstacles):
+            if self.snake.check_collision(self.is_blocked):
                 self.game_over = True
                 
+    def snapshot(self):
+        return GameSnapshot(
+            tuple(SegmentState(seg.position, seg.direction, seg.target_position)
+                  for seg in self.snake.segments),
+            self.snake.current_color,
+            self.snake.direction,
+            self.snake.length,
+            tuple(food.snapshot() for food in self.foods if food.active),
+            tuple(obstacle.snapshot() for obstacle in self.obstacles if obstacle.is_active),
+            self.score,
+            self.game_over,
+            self.paused,
+            self.camera_mode,
+            self.camera_angle_x,
+            self.camera_angle_y,
+            self.camera_distance,
+            self.difficulty,
+            self.selecting_difficulty,
+            self.tick_count,
+            self.snake.heading,
+            self.volumetric
+        )
+        
+    def publish_snapshot(self):
+        # Fill the back buffer, then flip; the renderer only ever sees complete snapshots
+        back = 1 - self.front_snapshot
+        self.tick_count += 1
+        self.snapshots[back] = self.snapshot()
+        self.front_snapshot = back
+        
+    def latest_snapshot(self):
+        return self.snapshots[self.front_snapshot]
+        
+    def process_commands(self):
+        while self.commands:
+            kind, key, key_time = self.commands.popleft()
+            if kind == KEY_COMMAND:
+                self.handle_key(key, key_time)
+            else:
+                self.handle_special_key(key)
+                
+    def tick(self):
+        self.process_commands()
+        if not self.selecting_difficulty:
+            self.update()
+        self.publish_snapshot()
+        
+    def run_simulation(self):
+        next_tick = time.perf_counter()
+        while self.running:
+            self.tick()
+            next_tick += SIM_TICK_INTERVAL
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()  # Fell behind, don't try to catch up
+                
+    def start_simulation(self):
+        self.publish_snapshot()
+        self.running = True
+        self.sim_thread = threading.Thread(target=self.run_simulation, daemon=True)
+        self.sim_thread.start()
+        
+    def handle_key(self, key, key_time=None):
+        if self.selecting_difficulty:
+            if key == '\r' or key == '\n':
+                self.selecting_difficulty = False
+                self.reset()
+            elif key == 'v':
+                self.volumetric = not self.volumetric
+            return
+        
+        if key == 'r' and self.game_over:
+            self.reset()
+        elif key == 'p':
+            self.paused = not self.paused
+        elif key == 'c':
+            self.camera_mode = (self.camera_mode + 1) % 4
+        elif not self.game_over and not self.paused:
+            key_event = (key_time, self.camera_mode) if key_time is not None else None
+            if self.volumetric and key in ('q', 'e'):  # Climb or dive in every camera mode
+                self.snake.change_direction((0, 1, 0) if key == 'q' else (0, -1, 0), key_event)
+            elif self.camera_mode == 0:  # First-person controls
+                # While climbing or diving, turn relative to the last horizontal heading
+                current_dir = self.snake.queued_direction()
+                if current_dir[1] != 0:
+                    current_dir = self.snake.queued_heading()
+                if key == 'a':  # Turn left
+                    # Rotate direction 90 degrees left
+                    new_dir = (current_dir[2], 0, -current_dir[0])
+                    self.snake.change_direction(new_dir, key_event)
+                elif key == 'd':  # Turn right
+                    # Rotate direction 90 degrees right
+                    new_dir = (-current_dir[2], 0, current_dir[0])
+                    self.snake.change_direction(new_dir, key_event)
+            else:  # Other camera modes
+                if key == 'w':
+                    self.snake.change_direction((0, 0, -1), key_event)
+                elif key == 's':
+                    self.snake.change_direction((0, 0, 1), key_event)
+                elif key == 'a':
+                    self.snake.change_direction((-1, 0, 0), key_event)
+                elif key == 'd':
+                    self.snake.change_direction((1, 0, 0), key_event)
+                    
+    def handle_special_key(self, key):
+        if self.selecting_difficulty:
+            if key == GLUT_KEY_UP:
+                self.difficulty = max(EASY, self.difficulty - 1)
+            elif key == GLUT_KEY_DOWN:
+                self.difficulty = min(HARD, self.difficulty + 1)
+            return
+        
+        if self.camera_mode == 3:  # Free-look camera
+            if key == GLUT_KEY_UP:
+                self.camera_angle_x = min(self.camera_angle_x + 5, 90)
+            elif key == GLUT_KEY_DOWN:
+                self.camera_angle_x = max(self.camera_angle_x - 5, -90)
+            elif key == GLUT_KEY_LEFT:
+                self.camera_angle_y = (self.camera_angle_y - 5) % 360
+            elif key == GLUT_KEY_RIGHT:
+                self.camera_angle_y = (self.camera_angle_y + 5) % 360
+                
     def draw(self):
+        # Runs on the GLUT thread and only reads the latest published snapshot
+        snap = self.latest_snapshot()
+        self.drawn_snapshot = snap
+        
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         glLoadIdentity()
         
-        if not self.selecting_difficulty:
-            head_pos = self.snake.segments[0].target_position if len(self.snake.segments) > 0 else (0, 0, 0)
-            head_dir = self.snake.direction if len(self.snake.segments) > 0 else (0, 0, -1)
+        if not snap.selecting_difficulty:
+            head_pos = snap.segments[0].target_position if len(snap.segments) > 0 else (0, 0, 0)
+            head_dir = snap.snake_direction if len(snap.segments) > 0 else (0, 0, -1)
             
-            if self.camera_mode == 0:  # First-Person View
+            if snap.camera_mode == 0:  # First-Person View
                 # Calculate look direction based on snake's direction
                 look_at = (
                     head_pos[0] + head_dir[0],
                     head_pos[1] + head_dir[1],
                     head_pos[2] + head_dir[2]
                 )
+                # Climbing or diving, so keep the last horizontal heading overhead
+                up = (0, 1, 0)
+                if head_dir[1] != 0:
+                    up = tuple(-c * head_dir[1] for c in snap.snake_heading)
                 gluLookAt(
                     head_pos[0], head_pos[1] + 0.5, head_pos[2],  # Camera at head position
-                    look_at[0], head_pos[1] + 0.5, look_at[2],    # Looking where snake is going
-                    0, 1, 0                                       # Up vector
+                    look_at[0], look_at[1] + 0.5, look_at[2],     # Looking where snake is going
+                    *up                                           # Up vector
                 )
-            elif self.camera_mode == 1:  # Third-person
-                if len(self.snake.segments) > 1:
+            elif snap.camera_mode == 1:  # Third-person
+                if len(snap.segments) > 1:
                     tail_dir = (
-                        head_pos[0] - self.snake.segments[1].target_position[0],
-                        head_pos[1] - self.snake.segments[1].target_position[1],
-                        head_pos[2] - self.snake.segments[1].target_position[2]
+                        head_pos[0] - snap.segments[1].target_position[0],
+                        head_pos[1] - snap.segments[1].target_position[1],
+                        head_pos[2] - snap.segments[1].target_position[2]
                     )
                     length = math.sqrt(tail_dir[0]**2 + tail_dir[1]**2 + tail_dir[2]**2)
                     if length > 0:
                         tail_dir = (tail_dir[0]/length, tail_dir[1]/length, tail_dir[2]/length)
                 else:
                     tail_dir = (0, 0, -1)
+                if tail_dir[0] == 0 and tail_dir[2] == 0:  # Vertical, follow from behind the heading
+                    tail_dir = snap.snake_heading
                     
                 cam_pos = (
                     head_pos[0] - tail_dir[0] * 3,
@@ -538,95 +1398,58 @@ class Game:
                     head_pos[0], head_pos[1] + 0.5, head_pos[2],
                     0, 1, 0
                 )
-            elif self.camera_mode == 2:  # Top-down
+            elif snap.camera_mode == 2:  # Top-down
                 gluLookAt(
                     0, 20, 0.1,
                     0, 0, 0,
                     0, 0, -1
                 )
-            elif self.camera_mode == 3:  # Free-look
-                gluLookAt(0, 0, -self.camera_distance,
+            elif snap.camera_mode == 3:  # Free-look
+                gluLookAt(0, 0, -snap.camera_distance,
                           0, 0, 0,
                           0, 1, 0)
-                glRotatef(self.camera_angle_x, 1, 0, 0)
-                glRotatef(self.camera_angle_y, 0, 1, 0)
+                glRotatef(snap.camera_angle_x, 1, 0, 0)
+                glRotatef(snap.camera_angle_y, 0, 1, 0)
         
-        glColor3f(0.4, 0.8, 0.4)
-        glBegin(GL_QUADS)
-        glVertex3f(-GRID_SIZE//2, -0.5, -GRID_SIZE//2)
-        glVertex3f(GRID_SIZE//2, -0.5, -GRID_SIZE//2)
-        glVertex3f(GRID_SIZE//2, -0.5, GRID_SIZE//2)
-        glVertex3f(-GRID_SIZE//2, -0.5, GRID_SIZE//2)
-        glEnd()
+        self.renderer.draw_world(snap)
         
-        for i, segment in enumerate(self.snake.segments):
-            glPushMatrix()
-            pos = segment.position
-            glTranslatef(*pos)
-            dx, dy, dz = segment.direction
-            if dx != 0 or dz != 0:
-                angle = math.degrees(math.atan2(dx, dz))
-                glRotatef(angle, 0, 1, 0)
-            
-            if i == 0:
-                glColor3f(*self.snake.current_color)
-                glutSolidSphere(0.5, 16, 16)
-                glColor3f(1.0, 1.0, 1.0)
-                glPushMatrix()
-                glTranslatef(0.2, 0.2, 0.3)
-                glutSolidSphere(0.1, 8, 8)
-                glTranslatef(-0.4, 0, 0)
-                glutSolidSphere(0.1, 8, 8)
-                glPopMatrix()
-            else:
-                size = 0.4 * (0.9 + 0.1 * (i / len(self.snake.segments)))
-                color_factor = 0.7 + 0.3 * (i / len(self.snake.segments))
-                glColor3f(
-                    self.snake.current_color[0] * color_factor,
-                    self.snake.current_color[1] * color_factor,
-                    self.snake.current_color[2] * color_factor
-                )
-                glutSolidSphere(size, 12, 12)
-            glPopMatrix()
-            
-        for food in self.foods:
-            food.draw()
-            
-        for obstacle in self.obstacles:
-            obstacle.draw()
-            
-        camera_modes = ["First-Person", "Third-Person", "Top-Down", "Free-Look"]
         difficulties = ["Easy", "Medium", "Hard"]
         
-        if not self.selecting_difficulty:
-            self.draw_text(f"Score: {self.score}", -0.9, 0.9)
-            self.draw_text(f"Length: {self.snake.length}", -0.9, 0.8)
-            self.draw_text(f"Difficulty: {difficulties[self.difficulty]}", -0.9, 0.7)
-            self.draw_text(f"Camera: {camera_modes[self.camera_mode]}", -0.9, 0.6)
-            self.draw_text("WASD: Move | C: Camera | P: Pause | R: Restart", -0.9, -0.9)
+        if not snap.selecting_difficulty:
+            self.draw_text(f"Score: {snap.score}", -0.9, 0.9)
+            self.draw_text(f"Length: {snap.length}", -0.9, 0.8)
+            self.draw_text(f"Difficulty: {difficulties[snap.difficulty]}", -0.9, 0.7)
+            self.draw_text(f"Camera: {CAMERA_MODES[snap.camera_mode]}", -0.9, 0.6)
+            latency = self.latency_stats.mean(snap.camera_mode)
+            if latency is not None:
+                self.draw_text(f"Input latency: {latency * 1000:.0f} ms", -0.9, 0.5)
+            if snap.volumetric:
+                self.draw_text("WASD: Move | Q/E: Up/Down | C: Camera | P: Pause | R: Restart", -0.9, -0.9)
+            else:
+                self.draw_text("WASD: Move | C: Camera | P: Pause | R: Restart", -0.9, -0.9)
             
-            if self.game_over:
+            if snap.game_over:
                 self.draw_text("GAME OVER", -0.2, 0)
                 self.draw_text("Press R to restart", -0.3, -0.1)
                 
-            if self.paused:
+            if snap.paused:
                 self.draw_text("PAUSED", -0.15, 0)
         else:
             glColor3f(1.0, 1.0, 1.0)
             self.draw_text("Select Difficulty", -0.3, 0.5)
             
             glColor3f(1.0, 1.0, 0.0)
-            if self.difficulty == EASY:
+            if snap.difficulty == EASY:
                 self.draw_text("> EASY <", -0.15, 0.2)
             else:
                 self.draw_text("EASY", -0.1, 0.2)
                 
-            if self.difficulty == MEDIUM:
+            if snap.difficulty == MEDIUM:
                 self.draw_text("> MEDIUM <", -0.2, 0.0)
             else:
                 self.draw_text("MEDIUM", -0.15, 0.0)
                 
-            if self.difficulty == HARD:
+            if snap.difficulty == HARD:
                 self.draw_text("> HARD <", -0.15, -0.2)
             else:
                 self.draw_text("HARD", -0.1, -0.2)
@@ -634,8 +1457,22 @@ class Game:
             glColor3f(1.0, 1.0, 1.0)
             self.draw_text("Press ENTER to start", -0.3, -0.5)
             self.draw_text("Use UP/DOWN arrows to select", -0.4, -0.6)
+            arena = "3D Volume" if snap.volumetric else "Flat"
+            self.draw_text(f"Arena: {arena} (V to toggle)", -0.35, -0.7)
             
         glutSwapBuffers()
+        self.record_shown_turns(snap)
+        
+        if snap.selecting_difficulty and not self.startup_reported:
+            self.startup_reported = True
+            print(f"Startup: {(time.perf_counter() - LAUNCH_TIME) * 1000:.0f} ms to difficulty menu "
+                  f"(OpenGL import {GL_IMPORT_TIME * 1000:.0f} ms)")
+        
+    def record_shown_turns(self, snap):
+        now = time.perf_counter()
+        while self.shown_turns and self.shown_turns[0][0] <= snap.tick:
+            _, (key_time, camera_mode) = self.shown_turns.popleft()
+            self.latency_stats.record(camera_mode, now - key_time)
             
     def draw_text(self, text, x, y):
         glColor3f(1.0, 1.0, 1.0)
@@ -646,6 +1483,7 @@ class Game:
             
     def reset(self):
         self.snake = Snake()
+        self.turn_awaiting_animation = None
         self.foods = []
         self.score = 0
         self.game_over = False
@@ -682,82 +1520,44 @@ def reshape(w, h):
     glMatrixMode(GL_MODELVIEW)
 
 def keyboard(key, x, y):
-    global game
-    
-    key = key.decode('utf-8').lower()
-    
-    if game.selecting_difficulty:
-        if key == '\r' or key == '\n':
-            game.selecting_difficulty = False
-            game.reset()
-        return
-    
-    if key == 'r' and game.game_over:
-        game.reset()
-    elif key == 'p':
-        game.paused = not game.paused
-    elif key == 'c':
-        game.camera_mode = (game.camera_mode + 1) % 4
-        glutPostRedisplay()
-    elif not game.game_over and not game.paused:
-        if game.camera_mode == 0:  # First-person controls
-            if key == 'a':  # Turn left
-                # Rotate direction 90 degrees left
-                current_dir = game.snake.direction
-                new_dir = (current_dir[2], 0, -current_dir[0])
-                game.snake.change_direction(new_dir)
-            elif key == 'd':  # Turn right
-                # Rotate direction 90 degrees right
-                current_dir = game.snake.direction
-                new_dir = (-current_dir[2], 0, current_dir[0])
-                game.snake.change_direction(new_dir)
-        else:  # Other camera modes
-            if key == 'w':
-                game.snake.change_direction((0, 0, -1))
-            elif key == 's':
-                game.snake.change_direction((0, 0, 1))
-            elif key == 'a':
-                game.snake.change_direction((-1, 0, 0))
-            elif key == 'd':
-                game.snake.change_direction((1, 0, 0))
-            
+    game.commands.append((KEY_COMMAND, key.decode('utf-8').lower(), time.perf_counter()))
     glutPostRedisplay()
 
 def special_keys(key, x, y):
-    global game
-    
-    if game.selecting_difficulty:
-        if key == GLUT_KEY_UP:
-            game.difficulty = max(EASY, game.difficulty - 1)
-        elif key == GLUT_KEY_DOWN:
-            game.difficulty = min(HARD, game.difficulty + 1)
-        glutPostRedisplay()
-        return
-    
-    if game.camera_mode == 3:  # Free-look camera
-        if key == GLUT_KEY_UP:
-            game.camera_angle_x = min(game.camera_angle_x + 5, 90)
-        elif key == GLUT_KEY_DOWN:
-            game.camera_angle_x = max(game.camera_angle_x - 5, -90)
-        elif key == GLUT_KEY_LEFT:
-            game.camera_angle_y = (game.camera_angle_y - 5) % 360
-        elif key == GLUT_KEY_RIGHT:
-            game.camera_angle_y = (game.camera_angle_y + 5) % 360
-            
+    game.commands.append((SPECIAL_KEY_COMMAND, key, time.perf_counter()))
     glutPostRedisplay()
 
 def idle():
-    if not game.selecting_difficulty:
-        game.update()
-    glutPostRedisplay()
+    if game.latest_snapshot() is not game.drawn_snapshot:
+        glutPostRedisplay()
+    else:
+        time.sleep(SIM_TICK_INTERVAL / 4)  # Nothing new to draw, leave the CPU to the simulation
+
+def report_input_latency():
+    print(game.latency_stats.report())
+
+def parse_options(argv):
+    renderer = RENDERER_LEGACY
+    for arg in argv[1:]:
+        if arg.startswith('--renderer='):
+            renderer = arg.split('=', 1)[1]
+            argv.remove(arg)
+        elif arg == '--release':  # Already applied before importing OpenGL
+            argv.remove(arg)
+    if renderer not in (RENDERER_LEGACY, RENDERER_SHADER):
+        sys.exit(f"Unknown renderer '{renderer}', expected '{RENDERER_LEGACY}' or '{RENDERER_SHADER}'")
+    return renderer
 
 def main():
+    renderer = parse_options(sys.argv)
+    
     glutInit(sys.argv)
     glutInitDisplayMode(GLUT_DOUBLE | GLUT_RGB | GLUT_DEPTH)
     glutInitWindowSize(1000, 750)
     glutCreateWindow(b"3D Snake Game - Final Version")
     
     init()
+    game.renderer = create_renderer(renderer)
     
     glutDisplayFunc(display)
     glutReshapeFunc(reshape)
@@ -765,6 +1565,8 @@ def main():
     glutSpecialFunc(special_keys)
     glutIdleFunc(idle)
     
+    atexit.register(report_input_latency)
+    game.start_simulation()
     glutMainLoop()
 
 if __name__ == "__main__":